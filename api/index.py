@@ -1,8 +1,13 @@
 from flask import Flask, render_template, request, jsonify
+from flask.json.provider import DefaultJSONProvider
 import pandas as pd
 import os
 import sys
+import csv
 from datetime import datetime
+from functools import lru_cache
+from itertools import chain
+from collections import deque
 
 # Add parent directory to path to import modules
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -11,6 +16,22 @@ import storage
 
 app = Flask(__name__, template_folder='../templates', static_folder='../static')
 
+# Use orjson for request/response JSON when it is installed
+try:
+    import orjson
+
+    class ORJSONProvider(DefaultJSONProvider):
+        def dumps(self, obj, **kwargs):
+            return orjson.dumps(obj, default=self.default,
+                                option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY).decode()
+
+        def loads(self, s, **kwargs):
+            return orjson.loads(s)
+
+    app.json = ORJSONProvider(app)
+except ImportError:
+    pass
+
 # --- Configuration ---
 FILES = {
     'standard_times': 'wp_data.csv'
@@ -23,15 +44,46 @@ def get_wp_data_path():
     return os.path.join(base_dir, FILES['standard_times'])
 
 try:
-    wp_data = pd.read_csv(get_wp_data_path())
+    # Named columns only (spreadsheet exports can leave blank trailing ones); part ids
+    # stay strings and every area column is minutes per unit, so nothing is inferred
+    with open(get_wp_data_path(), newline='', encoding='utf-8-sig') as f:
+        wanted = [col for col in next(csv.reader(f)) if col.strip()]
+    wp_data = pd.read_csv(get_wp_data_path(), usecols=wanted,
+                          dtype={col: str if i == 0 else 'float64' for i, col in enumerate(wanted)})
     header = wp_data.columns.tolist() 
 except:
     wp_data = pd.DataFrame()
     header = []
 
+# Minutes per unit as STD_TIMES[part_id][area] - the table is static, so build it once
+STD_TIMES = {row[header[0]]: {c: row[c] for c in header[1:]} for row in wp_data.to_dict('records')}
+
+# Work area columns of the standard-times table, as shown in the UI
+HEADER_COLS = tuple(header[1:])
+
+# Dashboard work areas with their normalized names ('Paint_Booth' -> 'paint booth')
+WORK_AREAS = ('Autoclave', 'CCA', 'PAA', 'Paint_Booth', 'Prefit')
+WORK_AREAS_CLEAN = tuple(area.replace('_', ' ').lower() for area in WORK_AREAS)
+
+# --- Helper: Employee Skills ---
+# Normalize skill names (handle Paint_Booth vs Paint Booth); work areas are a tiny fixed set
+@lru_cache(maxsize=64)
+def normalize_skill(skill):
+    return skill.strip().lower().replace('_', ' ').replace('  ', ' ')
+
+# Parsed once at import instead of for every task/employee pair; looked up by id,
+# so the present-employee dicts do not carry trained_skills
+EMP_NORMALIZED_SKILLS = {
+    eid: frozenset(normalize_skill(s) for s in emp["trained_skills"].split(",") if s.strip())
+    for eid, emp in employees.items()
+}
+
+def has_skill(emp, work_area):
+    return normalize_skill(work_area) in EMP_NORMALIZED_SKILLS[emp["id"]]
+
 @app.route("/")
 def index():
-    return render_template("index.html", employees=employees, parts=parts, header=header[1:])
+    return render_template("index.html", employees=employees, parts=parts, header=HEADER_COLS)
 
 # --- ATTENDANCE ---
 
@@ -41,16 +93,12 @@ def mark_attendance():
     date = data.pop('date')
     shift = data.pop('shift')
     
-    # Convert remaining data to attendance dict
-    attendance_dict = {}
-    present_count = 0
-    for emp_id, present in data.items():
-        attendance_dict[emp_id] = present
-        if present:
-            present_count += 1
+    # Whatever remains is the {emp_id: present} attendance dict
+    present_count = sum(1 for present in data.values() if present)
     
     # Save using storage module
-    storage.save_attendance(date, shift, attendance_dict)
+    if not storage.save_attendance(date, shift, data):
+        return jsonify({"status": "error", "message": "Attendance could not be saved"}), 500
     
     # Calculate stats
     total_employees = len(employees)
@@ -82,76 +130,71 @@ def plan_production():
     shift = data['shift']
     
     # Get present employee IDs using storage module
-    present_ids = storage.get_present_employees(date, shift)
+    present_ids = set(storage.get_present_employees(date, shift))
 
     present_employees = [
-        {"id": eid, "name": emp["name"], "efficiency": emp["efficiency"], "trained_skills": emp["trained_skills"]}
+        {"id": eid, "name": emp["name"], "efficiency": emp["efficiency"]}
         for eid, emp in employees.items() if eid in present_ids
     ]
     
     # Fallback: if no attendance data, use all employees
     if not present_employees:
         present_employees = [
-            {"id": eid, "name": emp["name"], "efficiency": emp["efficiency"], "trained_skills": emp["trained_skills"]}
+            {"id": eid, "name": emp["name"], "efficiency": emp["efficiency"]}
             for eid, emp in employees.items()
         ]
 
+    # Nothing to plan: skip ranking employees and writing an empty plan
+    if not selected_parts:
+        return jsonify({"assignments": [], "present_count": len(present_employees)})
+
     total_tasks = []
     for item in selected_parts:
         part_id = item["part_id"]
         qty = int(item["quantity"])
         area = item["work_area"]
-        time_per_unit_min = wp_data.loc[wp_data[header[0]] == part_id, area].values
+        time_per_unit_min = STD_TIMES.get(part_id, {}).get(area, 0)
         part = parts[part_id]
-        total_minutes = time_per_unit_min[0] * qty if len(time_per_unit_min) > 0 else 0
+        total_minutes = time_per_unit_min * qty
         total_tasks.append({
             "part_name": part["name"],
             "part_id": part_id,
             "quantity": qty,
             "work_area": area,
             "total_minutes": total_minutes,
-            "time_per_unit": time_per_unit_min[0] if len(time_per_unit_min) > 0 else 0
+            "time_per_unit": time_per_unit_min
         })
 
     assignments = []
     log_entries = []
     total_tasks.sort(key=lambda x: x["total_minutes"], reverse=True)
-    assignment_employees = present_employees.copy()
-    
-    # Helper to normalize skill names
-    def normalize_skill(skill):
-        return skill.strip().lower().replace('_', ' ').replace('  ', ' ')
-    
-    def has_skill(emp, work_area):
-        normalized_area = normalize_skill(work_area)
-        skills = [normalize_skill(s) for s in emp["trained_skills"].split(",") if s.strip()]
-        return normalized_area in skills
+
+    # Employees ranked by efficiency once (ties keep roster order), plus one bucket per work
+    # area holding the skilled ones in the same order. Assigned employees are skipped lazily.
+    ranked = deque(sorted(present_employees, key=lambda x: x["efficiency"], reverse=True))
+    by_skill = {}
+    taken = set()
+
+    def take(bucket, from_best):
+        # Most efficient free employee from the front, least efficient from the back
+        while bucket:
+            emp = bucket.popleft() if from_best else bucket.pop()
+            if emp["id"] not in taken:
+                taken.add(emp["id"])
+                return emp
+        return None
 
     for task in total_tasks:
         task_assignments = []
-        best_operator = None
-        support_operator = None
-        
-        sorted_employees = sorted(assignment_employees, key=lambda x: x["efficiency"], reverse=True)
-        skilled_employees = [emp for emp in sorted_employees if has_skill(emp, task['work_area'])]
-        
-        if skilled_employees:
-            best_operator = skilled_employees[0]
-        elif sorted_employees:
-            best_operator = sorted_employees[0]
+        area = normalize_skill(task['work_area'])
+        if area not in by_skill:
+            by_skill[area] = deque(emp for emp in ranked if emp["id"] not in taken and has_skill(emp, area))
+        skilled = by_skill[area]
 
-        if best_operator:
-            assignment_employees.remove(best_operator)
-            sorted_employees = sorted(assignment_employees, key=lambda x: x["efficiency"], reverse=True)
-            skilled_employees = [emp for emp in sorted_employees if has_skill(emp, task['work_area'])]
-
-        if skilled_employees:
-            support_operator = skilled_employees[-1]
-        elif sorted_employees:
-            support_operator = sorted_employees[-1]
-
-        if support_operator:
-            assignment_employees.remove(support_operator)
+        # Best operator: most efficient skilled employee, else most efficient overall;
+        # support operator: least efficient skilled employee left, else least efficient overall
+        best_operator = take(skilled, True) or take(ranked, True)
+        support_operator = take(skilled, False) or take(ranked, False)
 
         task_assignments.append({
             "best_operator": best_operator["name"] if best_operator else "Unassigned",
@@ -243,43 +286,30 @@ def get_dashboard_data():
     shift = request.args.get('shift')
     
     response_data = {}
-    work_areas = ['Autoclave', 'CCA', 'PAA', 'Paint_Booth', 'Prefit']
 
     # Load data using storage module
     prod_records = storage.get_production(date, shift)
     mat_records = storage.get_materials(date)
 
-    for area in work_areas:
-        area_clean = area.replace('_', ' ').lower()
-        
-        prod_effs = []
-        mat_effs = []
-
-        for r in prod_records:
-            r_area = str(r.get('work_area', '')).lower().replace('_', ' ')
-            if r_area == area_clean:
-                prod_effs.append(r.get('efficiency', 0))
-
-        for r in mat_records:
-            r_area = str(r.get('work_area', '')).lower().replace('_', ' ')
-            if r_area == area_clean:
-                mat_effs.append(r.get('efficiency', 0))
+    # One pass over production then material records: efficiency sum and count per normalized area
+    eff_sums = {}
+    eff_counts = {}
+    for r in chain(prod_records, mat_records):
+        r_area = str(r.get('work_area', '')).lower().replace('_', ' ')
+        eff_sums[r_area] = eff_sums.get(r_area, 0) + r.get('efficiency', 0)
+        eff_counts[r_area] = eff_counts.get(r_area, 0) + 1
 
-        all_effs = prod_effs + mat_effs
-        avg_eff = sum(all_effs) / len(all_effs) if all_effs else 0
-        
-        response_data[area] = avg_eff
+    for area, area_clean in zip(WORK_AREAS, WORK_AREAS_CLEAN):
+        count = eff_counts.get(area_clean, 0)
+        response_data[area] = eff_sums[area_clean] / count if count else 0
 
     # Attendance
     total_employees = len(employees)
     present_count = storage.count_present(date, shift) if shift else 0
     
-    # If no shift specified, count for both shifts
+    # If no shift specified, report the best-attended shift of the day
     if not shift:
-        present_count = max(
-            storage.count_present(date, 'Day'),
-            storage.count_present(date, 'Night')
-        )
+        present_count = max(storage.count_present_by_shift(date).values())
 
     attendance_pct = (present_count / total_employees * 100) if total_employees > 0 else 0
     response_data['attendance_present'] = int(present_count)
@@ -4,16 +4,57 @@ Falls back to local CSV files when not running on Vercel.
 Uses date-based keys for ALL operations - instant read/write.
 """
 import os
+import re
+import csv
+import shutil
+import atexit
+import base64
 import json
-import pandas as pd
+import logging
+import threading
+import time
+from functools import lru_cache
+
+# orjson when installed; values are handed to the Redis clients as str either way
+try:
+    import orjson
+
+    def _dumps(obj):
+        return orjson.dumps(obj).decode()
+
+    _loads = orjson.loads
+except ImportError:
+    _dumps = json.dumps
+    _loads = json.loads
+
+logger = logging.getLogger(__name__)
 
 # Check if we're running on Vercel with KV configured
 def is_vercel_kv_available():
     return os.environ.get('KV_REST_API_URL') and os.environ.get('KV_REST_API_TOKEN')
 
-# Initialize Redis client only if on Vercel with KV configured
+# Initialize Redis client only if on Vercel with KV configured.
+# A plain TCP endpoint (REDIS_TCP_URL) is preferred when set: pooled keep-alive
+# connections skip the HTTP request and TLS setup the REST client pays per command.
 redis_client = None
-if is_vercel_kv_available():
+redis_is_tcp = False
+# What a failed Redis call can raise: connection and decode errors plus the client's own types
+REDIS_ERRORS = (OSError, ValueError)
+if os.environ.get('REDIS_TCP_URL'):
+    try:
+        import redis
+        redis_client = redis.Redis(connection_pool=redis.BlockingConnectionPool.from_url(
+            os.environ['REDIS_TCP_URL'],
+            max_connections=16,
+            socket_keepalive=True,
+            decode_responses=True  # str values, same as the REST client
+        ))
+        redis_is_tcp = True
+        REDIS_ERRORS += (redis.exceptions.RedisError,)
+    except Exception as e:
+        logger.error("Failed to initialize TCP Redis client: %s", e)
+        redis_client = None
+if redis_client is None and is_vercel_kv_available():
     try:
         from upstash_redis import Redis
         redis_client = Redis(
@@ -21,8 +62,21 @@ if is_vercel_kv_available():
             token=os.environ.get('KV_REST_API_TOKEN')
         )
     except Exception as e:
-        print(f"Failed to initialize Redis client: {e}")
+        logger.error("Failed to initialize Redis client: %s", e)
         redis_client = None
+    else:
+        try:
+            from httpx import HTTPError
+            from upstash_redis.errors import UpstashError
+            REDIS_ERRORS += (HTTPError, UpstashError)
+        except ImportError:
+            REDIS_ERRORS += (Exception,)
+
+# What reading a damaged or half-written local log can raise
+LOCAL_ERRORS = (OSError, ValueError, KeyError, csv.Error)
+
+# Shifts offered by the UI; used when a read covers the whole day
+SHIFTS = ('General', '1', '2')
 
 # Local file paths (for local development)
 LOCAL_FILES = {
@@ -31,83 +85,624 @@ LOCAL_FILES = {
     'material': 'material_log.csv'
 }
 
+# Columns of the local CSV files
+LOCAL_COLUMNS = {
+    'attendance': ['date', 'shift', 'emp_id', 'present'],
+    'production': ['date', 'shift', 'part_id', 'work_area', 'plan_qty', 'actual_qty', 'efficiency'],
+    'material': ['date', 'program', 'part_id', 'work_area', 'qty', 'req', 'actual', 'efficiency']
+}
+NUMERIC_FIELDS = {'plan_qty', 'actual_qty', 'efficiency', 'qty', 'req', 'actual'}
+
+BASE_PATH = os.path.dirname(os.path.abspath(__file__))
+# Absolute paths of the local files, resolved once
+LOCAL_PATHS = {kind: os.path.join(BASE_PATH, name) for kind, name in LOCAL_FILES.items()}
+
 def get_base_path():
     """Get base path for local files."""
-    return os.path.dirname(os.path.abspath(__file__))
+    return BASE_PATH
+
+# The local logs are kept one CSV per day, data/<kind>/<date>.csv, mirroring the
+# per-date Redis keys, so reads and rewrites only touch that day's rows
+LOCAL_DIRS = {kind: os.path.join(BASE_PATH, 'data', kind) for kind in LOCAL_FILES}
+_SAFE_DATE = re.compile(r'[0-9A-Za-z_-]+')
+_SPLIT_DONE = set()
+_SPLIT_LOCK = threading.Lock()
+
+def _split_legacy_log(kind):
+    """One-time split of an old single-file log (LOCAL_FILES) into per-day files."""
+    day_dir = LOCAL_DIRS[kind]
+    if os.path.isdir(day_dir) or not os.path.exists(LOCAL_PATHS[kind]):
+        return
+    by_date = {}
+    for row in _read_csv_rows(LOCAL_PATHS[kind]):
+        if row.get('date') and _SAFE_DATE.fullmatch(row['date']):
+            by_date.setdefault(row['date'], []).append(row)
+    if kind == 'production':
+        for date, rows in by_date.items():
+            by_date[date] = _merge_production(
+                rows, lambda r: (r.get('shift'), r.get('part_id'), r.get('work_area')))
+    # Built next to the target and renamed into place, so a failed split is simply redone
+    tmp_dir = day_dir + '.tmp'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    for date, rows in by_date.items():
+        with open(os.path.join(tmp_dir, f'{date}.csv'), 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=LOCAL_COLUMNS[kind], lineterminator='\n', extrasaction='ignore')
+            writer.writeheader()
+            writer.writerows(rows)
+    os.replace(tmp_dir, day_dir)
+    _invalidate_csv(LOCAL_PATHS[kind])
+
+def _local_path(kind, date, create=False):
+    """Path of the day file for kind/date, or None if the date cannot be used as a file name."""
+    if not isinstance(date, str) or not _SAFE_DATE.fullmatch(date):
+        return None
+    if kind not in _SPLIT_DONE:
+        with _SPLIT_LOCK:
+            if kind not in _SPLIT_DONE:
+                _split_legacy_log(kind)
+                _SPLIT_DONE.add(kind)
+    if create:
+        os.makedirs(LOCAL_DIRS[kind], exist_ok=True)
+    return os.path.join(LOCAL_DIRS[kind], f'{date}.csv')
+
+# Parsed local CSVs keyed by path: (file version, rows). Files only change through the
+# writers below, which update or drop their entry, so reads skip parsing until then.
+_CSV_CACHE = {}
+_CSV_CACHE_LOCK = threading.Lock()
+
+def _file_version(filepath):
+    try:
+        st = os.stat(filepath)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+def _read_csv_rows(filepath):
+    """Read a local CSV file as a list of dicts of strings (empty list if missing or empty).
+    The list is cached and shared between callers; copy rows before changing them."""
+    version = _file_version(filepath)
+    if version is None or version[1] == 0:
+        return []
+    with _CSV_CACHE_LOCK:
+        cached = _CSV_CACHE.get(filepath)
+    if cached and cached[0] == version:
+        return cached[1]
+    # utf-8-sig: some logs were saved from Excel with a BOM before the header
+    with open(filepath, newline='', encoding='utf-8-sig') as f:
+        rows = list(csv.DictReader(f))
+    with _CSV_CACHE_LOCK:
+        _CSV_CACHE[filepath] = (version, rows)
+    return rows
+
+def _invalidate_csv(filepath):
+    with _CSV_CACHE_LOCK:
+        _CSV_CACHE.pop(filepath, None)
+
+def _as_csv_row(row, fieldnames):
+    # Same strings csv.DictReader would give back for a written row
+    return {k: '' if row.get(k) is None else str(row.get(k)) for k in fieldnames}
+
+def _write_csv_rows(filepath, fieldnames, rows):
+    """Replace a local CSV file with the given rows (written to a temp file, then swapped in)."""
+    tmp_path = filepath + '.tmp'
+    with open(tmp_path, 'w', newline='', buffering=1 << 16) as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames, lineterminator='\n')
+        writer.writeheader()
+        writer.writerows(rows)
+    # Readers see either the old file or the new one, never a half-written log
+    os.replace(tmp_path, filepath)
+    with _CSV_CACHE_LOCK:
+        _CSV_CACHE[filepath] = (_file_version(filepath), [_as_csv_row(r, fieldnames) for r in rows])
+
+def _append_csv_rows(filepath, fieldnames, rows):
+    """Append rows to a local CSV file, writing the header only if the file is new or empty."""
+    rows = list(rows)
+    with _CSV_CACHE_LOCK:
+        before = _file_version(filepath)
+        cached = _CSV_CACHE.get(filepath)
+        with open(filepath, 'a', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=fieldnames, lineterminator='\n')
+            if f.tell() == 0:
+                writer.writeheader()
+            writer.writerows(rows)
+        # Extend the cached rows only if they matched the file we just appended to
+        if cached and cached[0] == before:
+            _CSV_CACHE[filepath] = (_file_version(filepath),
+                                    cached[1] + [_as_csv_row(r, fieldnames) for r in rows])
+        else:
+            _CSV_CACHE.pop(filepath, None)
+
+def _parse_number(value):
+    if value is None or value == '':
+        return float('nan')
+    try:
+        return int(value)
+    except ValueError:
+        return float(value)
+
+# Typed records per path, paired with the parsed row list they were built from
+_RECORD_CACHE = {}
+
+def _read_csv_records(filepath):
+    """Rows of a local CSV with numeric columns converted, built once per parsed file.
+    Shared like _read_csv_rows; callers copy the records they hand out."""
+    rows = _read_csv_rows(filepath)
+    with _CSV_CACHE_LOCK:
+        cached = _RECORD_CACHE.get(filepath)
+    if cached and cached[0] is rows:
+        return cached[1]
+    records = []
+    if rows:
+        # Convert column by column, then zip the columns back into one dict per row
+        names = list(rows[0])
+        columns = []
+        for name in names:
+            values = [row[name] for row in rows]
+            columns.append(list(map(_parse_number, values)) if name in NUMERIC_FIELDS else values)
+        records = [dict(zip(names, values)) for values in zip(*columns)]
+    with _CSV_CACHE_LOCK:
+        _RECORD_CACHE[filepath] = (rows, records)
+    return records
+
+# ============== REDIS READ CACHE ==============
+# Recent Redis reads kept in process for a few seconds, keyed by Redis key, so repeated
+# lookups of the same date/shift (count_present, dashboard refreshes) skip the round trip.
+# Writes from this process drop the keys they touch; other instances see them within the TTL.
+# Expired entries stay until evicted, so a failed refresh can fall back to the last good value.
+READ_CACHE_TTL = 5.0
+READ_CACHE_MAX = 256
+_READ_CACHE = {}
+_READ_CACHE_LOCK = threading.Lock()
+
+def _cached_read(key, fetch):
+    """Return fetch() for key, reusing a result younger than READ_CACHE_TTL. Errors are not cached;
+    if the fetch fails, an expired result is returned instead when there is one."""
+    now = time.monotonic()
+    with _READ_CACHE_LOCK:
+        entry = _READ_CACHE.get(key)
+    if entry and entry[0] > now:
+        return entry[1]
+    try:
+        value = fetch()
+    except REDIS_ERRORS as e:
+        if entry is None:
+            raise
+        logger.warning("Reading %s failed, serving the last good value: %s", key, e)
+        return entry[1]
+    _store_cached(key, value)
+    return value
+
+def _cached_read_many(keys, fetch_many):
+    """_cached_read for several keys: the ones not fresh in the cache are fetched together by
+    fetch_many(missing_keys), which returns their values in the same order."""
+    now = time.monotonic()
+    with _READ_CACHE_LOCK:
+        entries = {key: _READ_CACHE.get(key) for key in keys}
+    values = {key: entry[1] for key, entry in entries.items() if entry and entry[0] > now}
+    missing = [key for key in keys if key not in values]
+    if missing:
+        try:
+            fetched = fetch_many(missing)
+        except REDIS_ERRORS as e:
+            if any(entries[key] is None for key in missing):
+                raise
+            logger.warning("Reading %s failed, serving the last good values: %s", ', '.join(missing), e)
+            fetched = [entries[key][1] for key in missing]
+        else:
+            for key, value in zip(missing, fetched):
+                _store_cached(key, value)
+        values.update(zip(missing, fetched))
+    return [values[key] for key in keys]
+
+def _store_cached(key, value):
+    now = time.monotonic()
+    with _READ_CACHE_LOCK:
+        if len(_READ_CACHE) >= READ_CACHE_MAX:
+            for k in [k for k, (expires, _) in _READ_CACHE.items() if expires <= now]:
+                del _READ_CACHE[k]
+            if len(_READ_CACHE) >= READ_CACHE_MAX:
+                _READ_CACHE.clear()
+        _READ_CACHE[key] = (now + READ_CACHE_TTL, value)
+
+def _drop_cached(*keys):
+    with _READ_CACHE_LOCK:
+        for key in keys:
+            _READ_CACHE.pop(key, None)
 
 # ============== ATTENDANCE FUNCTIONS (OPTIMIZED) ==============
 
+@lru_cache(maxsize=4096)
 def _get_attendance_key(date, shift):
     """Key: att:2026-01-01:Day"""
     return f"att:{date}:{shift}"
 
-def get_attendance(date, shift):
-    """Get attendance for specific date/shift as dict {emp_id: present}."""
+# Redis attendance values are two bitsets over the employee ids listed in ATTENDANCE_INDEX_KEY,
+# base64-encoded as "<present>.<recorded>" (a few bytes instead of a JSON object per save).
+# The list is append-only, so an id keeps its first position for good; it is cached in process
+# and only re-read when a save meets an unknown id or a value has more bits than we know.
+ATTENDANCE_INDEX_KEY = "att:index"
+_attendance_roster = ([], {})  # (ids in index order, id -> first position)
+
+def _load_attendance_roster():
+    global _attendance_roster
+    ids = redis_client.lrange(ATTENDANCE_INDEX_KEY, 0, -1)
+    positions = {}
+    for i, emp_id in enumerate(ids):
+        positions.setdefault(emp_id, i)  # a concurrent append can list an id twice
+    _attendance_roster = (ids, positions)
+    return _attendance_roster
+
+def _attendance_positions(emp_ids):
+    """Position of every given id in the index, appending the ones it does not list yet."""
+    positions = _attendance_roster[1]
+    if any(emp_id not in positions for emp_id in emp_ids):
+        positions = _load_attendance_roster()[1]
+        missing = [emp_id for emp_id in emp_ids if emp_id not in positions]
+        if missing:
+            redis_client.rpush(ATTENDANCE_INDEX_KEY, *missing)
+            positions = _load_attendance_roster()[1]
+    return positions
+
+def _encode_attendance(attendance_dict):
+    positions = _attendance_positions(attendance_dict)
+    present = recorded = 0
+    for emp_id, is_present in attendance_dict.items():
+        bit = 1 << positions[emp_id]
+        recorded |= bit
+        if is_present:
+            present |= bit
+    size = (recorded.bit_length() + 7) // 8
+    return '.'.join(base64.b64encode(bits.to_bytes(size, 'little')).decode() for bits in (present, recorded))
+
+def _decode_attendance(data):
+    if not data:
+        return {}
+    if not isinstance(data, str):
+        return data
+    if data.startswith('{'):
+        return _loads(data)  # saved as JSON before the bitsets
+    present, recorded = (int.from_bytes(base64.b64decode(part), 'little') for part in data.split('.'))
+    ids = _attendance_roster[0]
+    if recorded >> len(ids):
+        ids = _load_attendance_roster()[0]  # ids added by another instance since we read the index
+    return {emp_id: bool(present >> i & 1)
+            for i, emp_id in enumerate(ids[:recorded.bit_length()]) if recorded >> i & 1}
+
+# The local log stores present as '1'/'0'; older rows spell it True/False, and a log saved
+# from a spreadsheet can have TRUE/FALSE or padding, so anything else is matched loosely
+PRESENT_TOKENS = {'1': True, '0': False, 'True': True, 'False': False, 'true': True, 'false': False}
+
+def _is_present(token):
+    present = PRESENT_TOKENS.get(token)
+    if present is None:
+        present = token.strip().lower() in ('1', 'true')
+    return present
+
+def _present_token(token):
+    """The '1'/'0' form of a stored present value; a value we cannot read is kept as written."""
+    present = PRESENT_TOKENS.get(token)
+    if present is None:
+        present = PRESENT_TOKENS.get(token.strip().lower())
+        if present is None:
+            return token
+    return '1' if present else '0'
+
+# Local attendance grouped as {(date, shift): {emp_id: present}}, rebuilt when the file changes
+_ATTENDANCE_INDEX = {}
+# One lock per day file, held by save_attendance for the whole read-rewrite-replace
+_ATTENDANCE_FILE_LOCKS = {}
+_ATTENDANCE_FILE_LOCKS_LOCK = threading.Lock()
+
+def _attendance_file_lock(filepath):
+    with _ATTENDANCE_FILE_LOCKS_LOCK:
+        return _ATTENDANCE_FILE_LOCKS.setdefault(filepath, threading.Lock())
+
+def _attendance_columns(header):
+    """Positions of the attendance columns in a file's header; None for one it lacks."""
+    return [header.index(col) if col in header else None for col in LOCAL_COLUMNS['attendance']]
+
+def _attendance_index(filepath):
+    version = _file_version(filepath)
+    if version is None or version[1] == 0:
+        return {}
+    with _CSV_CACHE_LOCK:
+        cached = _ATTENDANCE_INDEX.get(filepath)
+    if cached and cached[0] == version:
+        return cached[1]
+    # One streaming pass with csv.reader; no per-row dicts for the whole history
+    index = {}
+    with open(filepath, newline='', encoding='utf-8-sig') as f:
+        reader = csv.reader(f)
+        header = next(reader, [])
+        i_date, i_shift = header.index('date'), header.index('shift')
+        i_emp, i_present = header.index('emp_id'), header.index('present')
+        width = max(i_date, i_shift, i_emp, i_present) + 1
+        for row in reader:
+            if len(row) >= width:
+                index.setdefault((row[i_date], row[i_shift]), {})[row[i_emp]] = _is_present(row[i_present])
+    with _CSV_CACHE_LOCK:
+        _ATTENDANCE_INDEX[filepath] = (version, index)
+    return index
+
+# The value this process last SET under each attendance key: {key: (expires, encoded)}. A save
+# that would write the same value again within READ_CACHE_TTL is skipped. Values filled in by
+# reads never count, and a read showing another value under the key forgets the entry.
+_LAST_SAVED = {}
+_LAST_SAVED_LOCK = threading.Lock()
+
+def _read_attendance_value(key, data):
+    with _LAST_SAVED_LOCK:
+        saved = _LAST_SAVED.get(key)
+        if saved and saved[1] != data:
+            del _LAST_SAVED[key]  # replaced by another instance
+    return _decode_attendance(data)
+
+def _attendance(date, shift):
+    """Attendance dict for date/shift as held in the caches; callers must not modify it."""
     if redis_client:
         key = _get_attendance_key(date, shift)
         try:
-            data = redis_client.get(key)
-            if data:
-                return json.loads(data) if isinstance(data, str) else data
-            return {}
-        except:
+            return _cached_read(key, lambda: _read_attendance_value(key, redis_client.get(key)))
+        except REDIS_ERRORS as e:
+            logger.warning("Failed to read attendance %s: %s", key, e)
             return {}
     else:
-        filepath = os.path.join(get_base_path(), LOCAL_FILES['attendance'])
-        if os.path.exists(filepath) and os.path.getsize(filepath) > 0:
-            try:
-                df = pd.read_csv(filepath)
-                mask = (df['date'] == date) & (df['shift'] == shift)
-                filtered = df[mask]
-                result = {}
-                for _, row in filtered.iterrows():
-                    present = row['present']
-                    if isinstance(present, str):
-                        present = present.lower() == 'true'
-                    result[row['emp_id']] = present
-                return result
-            except:
+        try:
+            filepath = _local_path('attendance', date)
+            if filepath is None:
                 return {}
-        return {}
+            return _attendance_index(filepath).get((date, shift), {})
+        except LOCAL_ERRORS as e:
+            logger.warning("Failed to read local attendance for %s: %s", date, e)
+            return {}
+
+def _attendance_many(date, shifts):
+    """_attendance for several shifts of one day; Redis keys not in the caches come in one MGET."""
+    if redis_client:
+        keys = [_get_attendance_key(date, shift) for shift in shifts]
+        try:
+            return _cached_read_many(
+                keys, lambda missing: [_read_attendance_value(key, data)
+                                       for key, data in zip(missing, redis_client.mget(*missing))])
+        except REDIS_ERRORS as e:
+            logger.warning("Failed to read attendance for %s: %s", date, e)
+            return [{} for _ in shifts]
+    else:
+        try:
+            filepath = _local_path('attendance', date)
+            if filepath is None:
+                return [{} for _ in shifts]
+            index = _attendance_index(filepath)
+            return [index.get((date, shift), {}) for shift in shifts]
+        except LOCAL_ERRORS as e:
+            logger.warning("Failed to read local attendance for %s: %s", date, e)
+            return [{} for _ in shifts]
+
+def get_attendance(date, shift):
+    """Get attendance for specific date/shift as dict {emp_id: present}."""
+    return dict(_attendance(date, shift))
 
 def save_attendance(date, shift, attendance_dict):
     """Save attendance - instant write to specific key."""
+    # Stored as real booleans so readers never have to parse 'present'
+    attendance_dict = {emp_id: bool(present) for emp_id, present in attendance_dict.items()}
     if redis_client:
         key = _get_attendance_key(date, shift)
         try:
-            redis_client.set(key, json.dumps(attendance_dict))
-            return True
-        except:
+            encoded = _encode_attendance(attendance_dict)
+            now = time.monotonic()
+            with _LAST_SAVED_LOCK:
+                saved = _LAST_SAVED.get(key)
+            if saved and saved[0] > now and saved[1] == encoded:
+                return True  # this process just wrote exactly this
+            redis_client.set(key, encoded)
+        except REDIS_ERRORS as e:
+            logger.warning("Failed to save attendance %s: %s", key, e)
+            with _LAST_SAVED_LOCK:
+                _LAST_SAVED.pop(key, None)
+            _drop_cached(key)
             return False
+        with _LAST_SAVED_LOCK:
+            if len(_LAST_SAVED) >= READ_CACHE_MAX:
+                _LAST_SAVED.clear()
+            _LAST_SAVED[key] = (now + READ_CACHE_TTL, encoded)
+        _store_cached(key, attendance_dict)
+        return True
     else:
-        filepath = os.path.join(get_base_path(), LOCAL_FILES['attendance'])
-        if os.path.exists(filepath) and os.path.getsize(filepath) > 0:
+        filepath = _local_path('attendance', date, create=True)
+        if filepath is None:
+            return False
+        with _attendance_file_lock(filepath):
+            if _attendance_index(filepath).get((date, shift)) == attendance_dict:
+                return True  # unchanged, leave the file alone
+            # Stream the day's file into a temp file, dropping the rows being replaced, then swap it in.
+            # The lock covers this process's threads; the pid keeps other processes' temp files apart.
+            tmp_path = f"{filepath}.{os.getpid()}.tmp"
             try:
-                existing_df = pd.read_csv(filepath)
-                existing_df = existing_df[~((existing_df['date'] == date) & (existing_df['shift'] == shift))]
-            except:
-                existing_df = pd.DataFrame(columns=['date', 'shift', 'emp_id', 'present'])
-        else:
-            existing_df = pd.DataFrame(columns=['date', 'shift', 'emp_id', 'present'])
-        
-        new_rows = [{'date': date, 'shift': shift, 'emp_id': emp_id, 'present': present} 
-                    for emp_id, present in attendance_dict.items()]
-        new_df = pd.DataFrame(new_rows)
-        combined_df = pd.concat([existing_df, new_df], ignore_index=True)
-        combined_df.to_csv(filepath, index=False)
+                with open(tmp_path, 'w', newline='', buffering=1 << 16) as out:
+                    writer = csv.writer(out, lineterminator='\n')
+                    writer.writerow(LOCAL_COLUMNS['attendance'])
+                    try:
+                        with open(filepath, newline='', encoding='utf-8-sig') as f:
+                            reader = csv.reader(f)
+                            # Columns are found by name, as _attendance_index does; short rows are padded
+                            columns = _attendance_columns(next(reader, None) or LOCAL_COLUMNS['attendance'])
+                            for row in reader:
+                                if not row:
+                                    continue
+                                row_date, row_shift, emp_id, token = (
+                                    row[i] if i is not None and i < len(row) else '' for i in columns)
+                                if row_date == date and row_shift == shift:
+                                    continue
+                                # Kept rows get the '1'/'0' token too, so old logs convert as they go
+                                writer.writerow((row_date, row_shift, emp_id, _present_token(token)))
+                    except FileNotFoundError:
+                        pass
+                    writer.writerows((date, shift, emp_id, '1' if present else '0')
+                                     for emp_id, present in attendance_dict.items())
+                os.replace(tmp_path, filepath)
+            except BaseException:
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+                raise
+            _invalidate_csv(filepath)
         return True
 
 def get_present_employees(date, shift):
     """Get list of present employee IDs for date/shift."""
-    attendance = get_attendance(date, shift)
-    return [emp_id for emp_id, present in attendance.items() if present]
+    return [emp_id for emp_id, present in _attendance(date, shift).items() if present]
 
 def count_present(date, shift):
     """Count present employees for date/shift."""
-    return len(get_present_employees(date, shift))
+    return sum(1 for present in _attendance(date, shift).values() if present)
+
+def count_present_by_shift(date):
+    """Present count for every shift of date as {shift: count}, read in one round trip."""
+    return {shift: sum(1 for present in attendance.values() if present)
+            for shift, attendance in zip(SHIFTS, _attendance_many(date, SHIFTS))}
+
+# ============== REDIS RECORD HELPERS ==============
+# Material keys are Redis lists with one JSON record per element, so saving is a single
+# RPUSH instead of GET + decode + extend + SET. Production keys are hashes with one JSON
+# record per "part_id:work_area" field, so updating an actual quantity touches one field.
+
+def _eval(script, keys, args=()):
+    # redis-py and upstash-redis take script keys and arguments differently
+    if redis_is_tcp:
+        return redis_client.eval(script, len(keys), *keys, *args)
+    return redis_client.eval(script, keys=list(keys), args=list(args))
+
+# Replaces a JSON-array string key with a list of the given items, but only if the key still
+# holds the JSON the caller decoded; returns 0 when another instance got there first
+_LIST_FROM_JSON = """
+if redis.call('TYPE', KEYS[1]).ok ~= 'string' or redis.call('GET', KEYS[1]) ~= ARGV[1] then return 0 end
+redis.call('DEL', KEYS[1])
+if #ARGV > 1 then redis.call('RPUSH', KEYS[1], unpack(ARGV, 2)) end
+return 1
+"""
+
+def _read_records(key):
+    """All records stored under a list key."""
+    try:
+        items = redis_client.lrange(key, 0, -1)
+    except REDIS_ERRORS:
+        # Keys written before the switch to lists hold one JSON array; convert them in place.
+        # The swap is conditional, so rows another instance pushes meanwhile are never deleted.
+        data = redis_client.get(key)
+        records = (_loads(data) if data else None) or []
+        if data and _eval(_LIST_FROM_JSON, [key], [data, *[_dumps(r) for r in records]]):
+            return records
+        items = redis_client.lrange(key, 0, -1)
+    return [_loads(item) for item in items]
+
+def _append_records(key, entries):
+    if not entries:
+        return
+    items = [_dumps(e) for e in entries]
+    try:
+        redis_client.rpush(key, *items)
+    except REDIS_ERRORS:
+        _read_records(key)  # converts an old single-JSON key to a list, then retry
+        redis_client.rpush(key, *items)
+
+def _production_field(part_id, work_area):
+    return f"{part_id}:{work_area}"
+
+# Both backends keep one production record per date, shift, part and work area. Planning it
+# again takes the new plan but keeps the actual quantity and efficiency already recorded;
+# duplicates left by older versions merge the same way (updates always went to the first).
+def _replan(existing, planned):
+    if existing is None:
+        return planned
+    return {**planned, 'actual_qty': existing.get('actual_qty', 0), 'efficiency': existing.get('efficiency', 0)}
+
+def _merge_production(records, record_key):
+    merged = {}
+    for r in records:
+        k = record_key(r)
+        merged[k] = _replan(merged.get(k), r)
+    return list(merged.values())
+
+# Replaces a list key of ARGV[1] items with a hash of the given field/value pairs, unless
+# another instance converted or extended it since it was read; returns 0 in that case
+_HASH_FROM_LIST = """
+if redis.call('TYPE', KEYS[1]).ok ~= 'list' or redis.call('LLEN', KEYS[1]) ~= tonumber(ARGV[1]) then return 0 end
+redis.call('DEL', KEYS[1])
+redis.call('HSET', KEYS[1], unpack(ARGV, 2))
+return 1
+"""
+
+def _to_production_hash(key):
+    """Convert a production key from an older layout (JSON array or list) into a hash."""
+    records = _read_records(key)
+    merged = _merge_production(records, lambda r: _production_field(r.get('part_id'), r.get('work_area')))
+    if not merged:
+        return []
+    args = [str(len(records))]
+    for r in merged:
+        args += [_production_field(r.get('part_id'), r.get('work_area')), _dumps(r)]
+    if _eval(_HASH_FROM_LIST, [key], args):
+        return merged
+    return [_loads(v) for v in redis_client.hvals(key)]  # converted by another instance
+
+# Sets ARGV field/expected/new triples on a hash, only if every field still holds its expected
+# value ('' for absent); returns 0 without writing anything otherwise
+_HSET_IF_UNCHANGED = """
+for i = 1, #ARGV, 3 do
+    if (redis.call('HGET', KEYS[1], ARGV[i]) or '') ~= ARGV[i + 1] then return 0 end
+end
+for i = 1, #ARGV, 3 do redis.call('HSET', KEYS[1], ARGV[i], ARGV[i + 2]) end
+return 1
+"""
+PRODUCTION_WRITE_RETRIES = 5
+
+def _change_production(key, fields, change):
+    """Rewrite fields of a production hash as change(field, record or None) -> record or None
+    (None leaves the field alone). Read and write are checked-and-set, so an edit from another
+    instance in between makes it start over instead of being overwritten.
+    Returns whether anything was written."""
+    for _ in range(PRODUCTION_WRITE_RETRIES):
+        try:
+            current = redis_client.hmget(key, *fields)
+        except REDIS_ERRORS:
+            _to_production_hash(key)  # older layout; convert, then retry
+            current = redis_client.hmget(key, *fields)
+        args = []
+        for field, data in zip(fields, current):
+            record = change(field, _loads(data) if data else None)
+            if record is not None:
+                args += [field, data or '', _dumps(record)]
+        if not args:
+            return False
+        if _eval(_HSET_IF_UNCHANGED, [key], args):
+            return True
+    logger.warning("Gave up writing %s after %d conflicting edits", key, PRODUCTION_WRITE_RETRIES)
+    return False
+
+def _read_production(key):
+    try:
+        values = redis_client.hvals(key)
+    except REDIS_ERRORS:
+        return _to_production_hash(key)
+    return [_loads(v) for v in values]
+
+_HVALS_MANY = "local out = {} for i, k in ipairs(KEYS) do out[i] = redis.call('HVALS', k) end return out"
+
+def _read_production_many(keys):
+    """Records of several production hashes, fetched in one round trip."""
+    try:
+        hashes = _eval(_HVALS_MANY, keys)
+    except REDIS_ERRORS:
+        # e.g. a key still in an older layout
+        return [r for key in keys for r in _read_production(key)]
+    return [_loads(v) for values in hashes for v in values]
 
 # ============== PRODUCTION FUNCTIONS (OPTIMIZED) ==============
 
+@lru_cache(maxsize=4096)
 def _get_production_key(date, shift):
     """Key: prod:2026-01-01:Day"""
     return f"prod:{date}:{shift}"
@@ -115,98 +710,151 @@ def _get_production_key(date, shift):
 def get_production(date, shift=None):
     """Get production records for date/shift."""
     if redis_client:
-        if shift:
-            key = _get_production_key(date, shift)
-            try:
-                data = redis_client.get(key)
-                if data:
-                    return json.loads(data) if isinstance(data, str) else data
-                return []
-            except:
-                return []
-        else:
-            # Get both shifts
-            results = []
-            for s in ['Day', 'Night']:
-                key = _get_production_key(date, s)
-                try:
-                    data = redis_client.get(key)
-                    if data:
-                        records = json.loads(data) if isinstance(data, str) else data
-                        results.extend(records)
-                except:
-                    pass
-            return results
+        try:
+            if shift:
+                key = _get_production_key(date, shift)
+                return list(_cached_read(key, lambda: _read_production(key)))
+            # Every shift's hash in one round trip
+            keys = [_get_production_key(date, s) for s in SHIFTS]
+            return list(_cached_read(_get_production_key(date, '*'), lambda: _read_production_many(keys)))
+        except REDIS_ERRORS as e:
+            logger.warning("Failed to read production for %s: %s", date, e)
+            return []
     else:
-        filepath = os.path.join(get_base_path(), LOCAL_FILES['production'])
-        if os.path.exists(filepath) and os.path.getsize(filepath) > 0:
-            try:
-                df = pd.read_csv(filepath)
-                mask = (df['date'] == date)
-                if shift:
-                    mask = mask & (df['shift'] == shift)
-                return df[mask].to_dict('records')
-            except:
+        flush_production_updates()  # read-your-writes for debounced actual quantities
+        try:
+            filepath = _local_path('production', date)
+            if filepath is None:
                 return []
-        return []
+            return [dict(r) for r in _read_csv_records(filepath)
+                    if r['date'] == date and (not shift or r['shift'] == shift)]
+        except LOCAL_ERRORS as e:
+            logger.warning("Failed to read local production for %s: %s", date, e)
+            return []
 
 def save_production_plan(date, shift, entries):
     """Save production plan - instant write to specific key."""
+    if not entries:
+        return True  # empty form: nothing to write, no cache to drop
     if redis_client:
         key = _get_production_key(date, shift)
+        # The last entry for a part and work area is the plan
+        planned = {_production_field(e.get('part_id'), e.get('work_area')): e for e in entries}
         try:
-            # Get existing and append
-            existing = []
-            data = redis_client.get(key)
-            if data:
-                existing = json.loads(data) if isinstance(data, str) else data
-            existing.extend(entries)
-            redis_client.set(key, json.dumps(existing))
-            return True
-        except:
+            return _change_production(key, list(planned),
+                                      lambda field, existing: _replan(existing, planned[field]))
+        except REDIS_ERRORS as e:
+            logger.warning("Failed to save production plan %s: %s", key, e)
             return False
+        finally:
+            # Dropped after the write, so a read racing it cannot re-cache the old records
+            _drop_cached(key, _get_production_key(date, '*'))
     else:
-        filepath = os.path.join(get_base_path(), LOCAL_FILES['production'])
-        df = pd.DataFrame(entries)
-        df.to_csv(filepath, mode='a', header=not os.path.exists(filepath), index=False)
+        filepath = _local_path('production', date, create=True)
+        if filepath is None:
+            return False
+        planned = {(e.get('part_id'), e.get('work_area')): {'date': date, 'shift': shift, **e} for e in entries}
+        # Under the flush lock so a pending rewrite cannot drop the appended rows
+        with _PRODUCTION_FLUSH_LOCK:
+            flush_production_updates()  # actual quantities must be in the file before re-planning
+            rows = _read_csv_rows(filepath)
+
+            def replanned(row):
+                return (row['date'] == date and row['shift'] == shift
+                        and (row['part_id'], row['work_area']) in planned)
+            if not any(replanned(row) for row in rows):
+                _append_csv_rows(filepath, LOCAL_COLUMNS['production'], planned.values())
+                return True
+            merged, done = [], set()
+            for row in rows:
+                if not replanned(row):
+                    merged.append(row)
+                    continue
+                k = (row['part_id'], row['work_area'])
+                if k not in done:  # later duplicates fold into the first
+                    done.add(k)
+                    merged.append(_replan(row, planned[k]))
+            merged += [entry for k, entry in planned.items() if k not in done]
+            _write_csv_rows(filepath, LOCAL_COLUMNS['production'], merged)
         return True
 
 def update_production_actual(date, shift, part_id, work_area, actual_qty, efficiency):
     """Update actual quantity and efficiency for a production entry."""
     if redis_client:
         key = _get_production_key(date, shift)
+        field = _production_field(part_id, work_area)
         try:
-            data = redis_client.get(key)
-            if not data:
-                return False
-            records = json.loads(data) if isinstance(data, str) else data
-            updated = False
-            for r in records:
-                if r.get('part_id') == part_id and r.get('work_area') == work_area:
-                    r['actual_qty'] = actual_qty
-                    r['efficiency'] = efficiency
-                    updated = True
-                    break
-            if updated:
-                redis_client.set(key, json.dumps(records))
-            return updated
-        except:
+            # Read and rewrite just this record's field
+            return _change_production(key, [field], lambda field, r: r and {
+                **r, 'actual_qty': actual_qty, 'efficiency': efficiency})
+        except REDIS_ERRORS as e:
+            logger.warning("Failed to update production %s: %s", key, e)
             return False
+        finally:
+            _drop_cached(key, _get_production_key(date, '*'))
     else:
-        filepath = os.path.join(get_base_path(), LOCAL_FILES['production'])
-        if not os.path.exists(filepath):
+        filepath = _local_path('production', date)
+        if filepath is None:
             return False
-        df = pd.read_csv(filepath)
-        mask = (df['date'] == date) & (df['shift'] == shift) & (df['part_id'] == part_id) & (df['work_area'] == work_area)
-        if mask.any():
-            df.loc[mask, 'actual_qty'] = actual_qty
-            df.loc[mask, 'efficiency'] = efficiency
-            df.to_csv(filepath, index=False)
-            return True
-        return False
+        # This fires on every keystroke in the UI: record the latest value and let
+        # flush_production_updates rewrite the file once the edits pause
+        found = any(row['date'] == date and row['shift'] == shift
+                    and row['part_id'] == part_id and row['work_area'] == work_area
+                    for row in _read_csv_rows(filepath))
+        if found:
+            _queue_production_update((date, shift, part_id, work_area), actual_qty, efficiency)
+        return found
+
+# Debounced local production updates: {(date, shift, part_id, work_area): (actual_qty, efficiency)}
+_PENDING_UPDATES = {}
+_PENDING_LOCK = threading.Lock()
+_PRODUCTION_FLUSH_LOCK = threading.RLock()
+_flush_timer = None
+FLUSH_DELAY = 1.0         # seconds without edits before the production log is rewritten
+FLUSH_MAX_PENDING = 50    # rewrite right away once this many rows are waiting
+
+def _queue_production_update(key, actual_qty, efficiency):
+    global _flush_timer
+    with _PENDING_LOCK:
+        _PENDING_UPDATES[key] = (actual_qty, efficiency)
+        flush_now = len(_PENDING_UPDATES) >= FLUSH_MAX_PENDING
+        if _flush_timer is not None:
+            _flush_timer.cancel()
+        _flush_timer = None
+        if not flush_now:
+            _flush_timer = threading.Timer(FLUSH_DELAY, flush_production_updates)
+            _flush_timer.daemon = True
+            _flush_timer.start()
+    if flush_now:
+        flush_production_updates()
+
+def flush_production_updates():
+    """Apply all pending actual-quantity updates to the local production logs, one rewrite per day."""
+    global _flush_timer
+    with _PRODUCTION_FLUSH_LOCK:
+        with _PENDING_LOCK:
+            pending = dict(_PENDING_UPDATES)
+            _PENDING_UPDATES.clear()
+            if _flush_timer is not None:
+                _flush_timer.cancel()
+                _flush_timer = None
+        if not pending:
+            return
+        for date in {key[0] for key in pending}:
+            filepath = _local_path('production', date)
+            # Copy on write: the parsed rows are shared through the CSV cache
+            rows = list(_read_csv_rows(filepath))
+            for i, row in enumerate(rows):
+                update = pending.get((row['date'], row['shift'], row['part_id'], row['work_area']))
+                if update:
+                    rows[i] = {**row, 'actual_qty': update[0], 'efficiency': update[1]}
+            _write_csv_rows(filepath, LOCAL_COLUMNS['production'], rows)
+
+atexit.register(flush_production_updates)
 
 # ============== MATERIAL FUNCTIONS (OPTIMIZED) ==============
 
+@lru_cache(maxsize=4096)
 def _get_material_key(date):
     """Key: mat:2026-01-01"""
     return f"mat:{date}"
@@ -216,39 +864,38 @@ def get_materials(date):
     if redis_client:
         key = _get_material_key(date)
         try:
-            data = redis_client.get(key)
-            if data:
-                return json.loads(data) if isinstance(data, str) else data
-            return []
-        except:
+            return list(_cached_read(key, lambda: _read_records(key)))
+        except REDIS_ERRORS as e:
+            logger.warning("Failed to read materials %s: %s", key, e)
             return []
     else:
-        filepath = os.path.join(get_base_path(), LOCAL_FILES['material'])
-        if os.path.exists(filepath) and os.path.getsize(filepath) > 0:
-            try:
-                df = pd.read_csv(filepath)
-                return df[df['date'] == date].to_dict('records')
-            except:
+        try:
+            filepath = _local_path('material', date)
+            if filepath is None:
                 return []
-        return []
+            return [dict(r) for r in _read_csv_records(filepath) if r['date'] == date]
+        except LOCAL_ERRORS as e:
+            logger.warning("Failed to read local materials for %s: %s", date, e)
+            return []
 
 def save_materials(date, entries):
     """Save materials - instant write to specific key."""
+    if not entries:
+        return True
     if redis_client:
         key = _get_material_key(date)
         try:
-            # Get existing and append
-            existing = []
-            data = redis_client.get(key)
-            if data:
-                existing = json.loads(data) if isinstance(data, str) else data
-            existing.extend(entries)
-            redis_client.set(key, json.dumps(existing))
+            _append_records(key, entries)
             return True
-        except:
+        except REDIS_ERRORS as e:
+            logger.warning("Failed to save materials %s: %s", key, e)
             return False
+        finally:
+            _drop_cached(key)
     else:
-        filepath = os.path.join(get_base_path(), LOCAL_FILES['material'])
-        df = pd.DataFrame(entries)
-        df.to_csv(filepath, mode='a', header=not os.path.exists(filepath), index=False)
+        filepath = _local_path('material', date, create=True)
+        if filepath is None:
+            return False
+        _append_csv_rows(filepath, LOCAL_COLUMNS['material'],
+                         ({'date': date, **entry} for entry in entries))
         return True